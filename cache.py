@@ -0,0 +1,120 @@
+"""
+Extraction Cache Module
+
+Content-addressable on-disk cache of validated extractions, so re-running the
+pipeline on unchanged PDFs skips the LLM call.
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: str) -> str:
+    """
+    Hash a file's content.
+    
+    Computed once per PDF and shared by the extraction and text caches.
+    
+    Args:
+        path: Path to the file
+    
+    Returns:
+        Hex SHA-256 digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Stores extraction results as JSON files keyed by content hash."""
+    
+    def __init__(self, cache_dir: str):
+        """
+        Initialize the extraction cache.
+        
+        Args:
+            cache_dir: Directory to store cached extractions
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def make_key(pdf_digest: str, model: str, prompt_version: bytes) -> str:
+        """
+        Build the cache key for a PDF.
+        
+        Args:
+            pdf_digest: Content digest of the PDF from file_digest
+            model: Claude model used for extraction
+            prompt_version: Version tag of the extraction prompt
+        
+        Returns:
+            Hex SHA-256 digest identifying the extraction
+        """
+        return hashlib.sha256(
+            pdf_digest.encode() + b"\0" + model.encode() + b"\0" + prompt_version
+        ).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached extraction.
+        
+        Args:
+            key: Cache key from make_key
+        
+        Returns:
+            Cached extraction or None if not cached
+        """
+        path = self._path(key)
+        if not path.exists():
+            return None
+        
+        try:
+            return orjson.loads(path.read_bytes())["value"]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path.name}: {str(e)}")
+            return None
+    
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Store an extraction in the cache.
+        
+        Args:
+            key: Cache key from make_key
+            value: Extraction to cache
+        """
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        entry = {
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+            "value": value
+        }
+        
+        try:
+            tmp_path.write_bytes(orjson.dumps(entry))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {path.name}: {str(e)}")
+    
+    def evict(self, key: str) -> None:
+        """
+        Remove an extraction from the cache.
+        
+        Args:
+            key: Cache key from make_key
+        """
+        self._path(key).unlink(missing_ok=True)
@@ -4,41 +4,113 @@ Data Extraction Module
 Uses LLM to extract structured data from PDF text content.
 """
 
-import json
+import asyncio
+import contextlib
 import logging
-from typing import Dict, Any, Optional
+import re
+import time
+from typing import AsyncContextManager, Dict, Any, List, Optional
 
-import anthropic
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Markdown code fence the model sometimes wraps its JSON in
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+# Claude model used when none is given
+DEFAULT_MODEL = "claude-3-5-haiku-latest"
+
+# Bump whenever the prompt or the cleaned document text changes so cached
+# extractions are invalidated
+PROMPT_VERSION = b"3"
+
+# Static part of the extraction prompt, sent ahead of the document and kept
+# byte-identical across calls. At a few hundred tokens it is below the 2048
+# token minimum Haiku needs for prompt caching, so it carries no
+# cache_control marker.
+SCHEMA_PREFIX = """Please extract the following fields from the solar maintenance document:
+
+- supplier_name: Name of the supplier/manufacturer
+- product_code: Product code or model number of the inverter
+- description: Description of the inverter product
+- startup_voltage: Startup voltage setting in volts (e.g., "150V")
+- firmware_version: Firmware version number (e.g., "v2.1.4")
+- valid_from: Start date and time when settings were active (ISO format)
+- valid_to: End date and time when settings were active (ISO format)
+- unit_price: Price per unit (optional)
+- currency: Currency code for the price (optional)
+- effective_date: Date when pricing/configuration became effective (optional)
+
+Important context:
+- Inverters convert DC electricity from solar panels to AC electricity
+- Startup voltage determines when solar panels turn on in the morning
+- Firmware version controls inverter parameters/settings
+- Valid from/to dates are crucial for audit trails and root cause analysis
+
+Please analyze the following solar maintenance document and extract the required fields.
+Return ONLY a valid JSON object with the extracted data. If a field is not found,
+use null for that field. Include any additional relevant information in an "extras" field.
+"""
+
+RETURN_FORMAT = """Return format:
+{
+    "supplier_name": "string or null",
+    "product_code": "string or null",
+    "description": "string or null",
+    "startup_voltage": "string or null",
+    "firmware_version": "string or null",
+    "valid_from": "ISO date-time string or null",
+    "valid_to": "ISO date-time string or null",
+    "unit_price": number or null,
+    "currency": "string or null",
+    "effective_date": "ISO date string or null",
+    "extras": {
+        "additional_fields": "any other relevant information"
+    }
+}
+"""
+
 
 class DataExtractor:
     """Extracts structured data from PDF text using LLM."""
     
-    def __init__(self, model: str = "claude-3-sonnet-20240229"):
+    # Fields the LLM is asked to extract
+    SCHEMA_FIELDS = frozenset({
+        "supplier_name", "product_code", "description",
+        "startup_voltage", "firmware_version", "valid_from", "valid_to",
+        "unit_price", "currency", "effective_date"
+    })
+    
+    # Fields an extraction must contain to be usable
+    REQUIRED_FIELDS = frozenset({
+        "supplier_name", "product_code", "description",
+        "startup_voltage", "firmware_version", "valid_from", "valid_to"
+    })
+    
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        max_retries: int = 2,
+        max_chars: Optional[int] = 40_000
+    ):
         """
         Initialize the data extractor.
         
         Args:
             model: Claude model to use for extraction
+            max_retries: Times to ask the model to fix an unparseable response
+            max_chars: Longest document text sent to the LLM; longer texts
+                keep their head and tail. None sends the full text.
         """
+        # Imported lazily: the HTTP client stack is slow to import
+        import anthropic
+        
         self.model = model
+        self.max_retries = max_retries
+        self.max_chars = max_chars
         self.client = anthropic.Anthropic()
-        
-        # Schema for extraction
-        self.schema = {
-            "supplier_name": "string",
-            "product_code": "string", 
-            "description": "string",
-            "startup_voltage": "string",
-            "firmware_version": "string",
-            "valid_from": "string (ISO date-time)",
-            "valid_to": "string (ISO date-time)",
-            "unit_price": "number (optional)",
-            "currency": "string (optional)",
-            "effective_date": "string (ISO date, optional)"
-        }
+        self.async_client = anthropic.AsyncAnthropic()
     
     def extract_data(self, pdf_text: str) -> Dict[str, Any]:
         """
@@ -51,91 +123,211 @@ class DataExtractor:
             Dictionary containing extracted data and extras
         """
         try:
-            # Create prompt for LLM
-            prompt = self._create_extraction_prompt(pdf_text)
-            
-            # Call Claude API
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+            request = self._build_request(pdf_text)
+            
+            for attempt in range(self.max_retries + 1):
+                # Call Claude API
+                response = self.client.messages.create(**request)
+                response_text = response.content[0].text
+                
+                # Parse response
+                try:
+                    extracted_data = self._parse_llm_response(response_text)
+                except ValueError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self._add_feedback(request, response_text, e)
+                    time.sleep(1.0 * (attempt + 1))
+                    continue
+                
+                logger.info("Successfully extracted data using LLM")
+                return extracted_data
+            
+        except Exception as e:
+            logger.error(f"Failed to extract data using LLM: {str(e)}")
+            raise ValueError(f"LLM extraction failed: {str(e)}")
+    
+    async def extract_data_async(
+        self,
+        pdf_text: str,
+        limiter: Optional[AsyncContextManager] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract structured data from PDF text using the async LLM client.
+        
+        Lets callers keep several requests in flight at once instead of
+        waiting on each round trip in turn.
+        
+        Args:
+            pdf_text: Text content extracted from PDF
+            limiter: Held around each API call, e.g. an asyncio.Semaphore
+                bounding concurrent requests; released during retry backoff
             
-            # Parse response
-            extracted_data = self._parse_llm_response(response.content[0].text)
+        Returns:
+            Dictionary containing extracted data and extras
+        """
+        try:
+            request = self._build_request(pdf_text)
             
-            logger.info("Successfully extracted data using LLM")
-            return extracted_data
+            for attempt in range(self.max_retries + 1):
+                async with limiter or contextlib.nullcontext():
+                    response = await self.async_client.messages.create(**request)
+                response_text = response.content[0].text
+                
+                try:
+                    extracted_data = self._parse_llm_response(response_text)
+                except ValueError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self._add_feedback(request, response_text, e)
+                    await asyncio.sleep(1.0 * (attempt + 1))
+                    continue
+                
+                logger.info("Successfully extracted data using LLM")
+                return extracted_data
             
         except Exception as e:
             logger.error(f"Failed to extract data using LLM: {str(e)}")
             raise ValueError(f"LLM extraction failed: {str(e)}")
     
-    def _create_extraction_prompt(self, pdf_text: str) -> str:
+    def extract_batch(
+        self,
+        texts: Dict[str, str],
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 60.0
+    ) -> Dict[str, Any]:
+        """
+        Extract structured data from many documents with one Message Batch.
+        
+        Batches are billed at a discount and suit offline runs where no
+        caller is waiting on an individual result.
+        
+        Args:
+            texts: Mapping of source file name to PDF text
+            poll_interval: Initial delay between status checks in seconds
+            max_poll_interval: Upper bound for the exponential backoff
+            
+        Returns:
+            Mapping of source file name to extracted data, or to the
+            ValueError describing why that document failed
+        """
+        # custom_id only allows [a-zA-Z0-9_-], so key requests by position
+        names = list(texts)
+        requests = [
+            {
+                "custom_id": f"doc-{index}",
+                "params": self._build_request(texts[name])
+            }
+            for index, name in enumerate(names)
+        ]
+        
+        try:
+            batch = self.client.messages.batches.create(requests=requests)
+            logger.info(f"Submitted batch {batch.id} with {len(requests)} documents")
+            
+            delay = poll_interval
+            while batch.processing_status != "ended":
+                time.sleep(delay)
+                delay = min(delay * 2, max_poll_interval)
+                batch = self.client.messages.batches.retrieve(batch.id)
+            
+            entries = list(self.client.messages.batches.results(batch.id))
+            
+        except Exception as e:
+            logger.error(f"Failed to run extraction batch: {str(e)}")
+            raise ValueError(f"LLM batch extraction failed: {str(e)}")
+        
+        results: Dict[str, Any] = {
+            name: ValueError("No result returned for document") for name in names
+        }
+        
+        for entry in entries:
+            name = names[int(entry.custom_id.split("-", 1)[1])]
+            
+            if entry.result.type != "succeeded":
+                results[name] = ValueError(f"LLM extraction {entry.result.type}")
+                continue
+            
+            try:
+                results[name] = self._parse_llm_response(entry.result.message.content[0].text)
+            except ValueError as e:
+                results[name] = e
+        
+        logger.info(f"Batch {batch.id} finished")
+        return results
+    
+    def _build_request(self, pdf_text: str) -> Dict[str, Any]:
+        """
+        Build the Messages API request parameters for a document.
+        
+        Args:
+            pdf_text: Text content from PDF
+            
+        Returns:
+            Keyword arguments for ``messages.create``
+        """
+        return {
+            "model": self.model,
+            "max_tokens": 4096,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": self._create_extraction_prompt(pdf_text)
+                }
+            ]
+        }
+    
+    def _add_feedback(self, request: Dict[str, Any], response_text: str, error: Exception) -> None:
+        """
+        Append a failed response and the parse error to the conversation.
+        
+        Retrying in the same conversation lets the model correct its own
+        output instead of re-extracting the whole document from scratch.
+        
+        Args:
+            request: Request parameters whose messages are extended in place
+            response_text: Raw response that failed to parse
+            error: Error raised while parsing the response
+        """
+        logger.warning(f"Retrying extraction after invalid response: {str(error)}")
+        request["messages"].extend([
+            {"role": "assistant", "content": response_text},
+            {
+                "role": "user",
+                "content": f"Your output had error: {error}. Fix and return valid JSON only."
+            }
+        ])
+    
+    def _create_extraction_prompt(self, pdf_text: str) -> List[Dict[str, Any]]:
         """
         Create prompt for LLM data extraction.
         
+        The static instructions and return format come first in their own
+        content block, followed by the document text.
+        
         Args:
             pdf_text: Text content from PDF
             
         Returns:
-            Formatted prompt for LLM
-        """
-        schema_description = """
-        Please extract the following fields from the solar maintenance document:
-        
-        - supplier_name: Name of the supplier/manufacturer
-        - product_code: Product code or model number of the inverter
-        - description: Description of the inverter product
-        - startup_voltage: Startup voltage setting in volts (e.g., "150V")
-        - firmware_version: Firmware version number (e.g., "v2.1.4")
-        - valid_from: Start date and time when settings were active (ISO format)
-        - valid_to: End date and time when settings were active (ISO format)
-        - unit_price: Price per unit (optional)
-        - currency: Currency code for the price (optional)
-        - effective_date: Date when pricing/configuration became effective (optional)
-        
-        Important context:
-        - Inverters convert DC electricity from solar panels to AC electricity
-        - Startup voltage determines when solar panels turn on in the morning
-        - Firmware version controls inverter parameters/settings
-        - Valid from/to dates are crucial for audit trails and root cause analysis
-        """
-        
-        prompt = f"""
-        {schema_description}
-        
-        Please analyze the following solar maintenance document and extract the required fields. 
-        Return ONLY a valid JSON object with the extracted data. If a field is not found, 
-        use null for that field. Include any additional relevant information in an "extras" field.
-        
-        Document text:
-        {pdf_text}
-        
-        Return format:
-        {{
-            "supplier_name": "string or null",
-            "product_code": "string or null", 
-            "description": "string or null",
-            "startup_voltage": "string or null",
-            "firmware_version": "string or null",
-            "valid_from": "ISO date-time string or null",
-            "valid_to": "ISO date-time string or null",
-            "unit_price": number or null,
-            "currency": "string or null",
-            "effective_date": "ISO date string or null",
-            "extras": {{
-                "additional_fields": "any other relevant information"
-            }}
-        }}
-        """
-        
-        return prompt
+            Content blocks for the user message
+        """
+        if self.max_chars is not None and len(pdf_text) > self.max_chars:
+            # Supplier details and dates usually sit near the start or end
+            half = self.max_chars // 2
+            pdf_text = (
+                pdf_text[:half] + "\n...[truncated]...\n" + pdf_text[len(pdf_text) - half:]
+            )
+        
+        return [
+            {
+                "type": "text",
+                "text": f"{SCHEMA_PREFIX}\n{RETURN_FORMAT}"
+            },
+            {
+                "type": "text",
+                "text": f"Document text:\n{pdf_text}"
+            }
+        ]
     
     def _parse_llm_response(self, response_text: str) -> Dict[str, Any]:
         """
@@ -147,35 +339,31 @@ class DataExtractor:
         Returns:
             Parsed data dictionary
         """
+        # Not logged here: callers log retries as warnings and final failures
+        # as errors
         try:
             # Clean response text (remove markdown formatting if present)
-            cleaned_text = response_text.strip()
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
+            match = _FENCE_RE.match(response_text)
+            cleaned_text = match.group(1) if match else response_text.strip()
             
             # Parse JSON
-            data = json.loads(cleaned_text)
+            data = orjson.loads(cleaned_text)
             
             # Separate main data from extras
-            main_data = {}
             extras = data.get("extras", {})
-            
-            for key in self.schema.keys():
-                if key in data and data[key] is not None:
-                    main_data[key] = data[key]
+            main_data = {
+                key: value for key, value in data.items()
+                if key in self.SCHEMA_FIELDS and value is not None
+            }
             
             return {
                 "data": main_data,
                 "extras": extras
             }
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {str(e)}")
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON response from LLM: {str(e)}")
         except Exception as e:
-            logger.error(f"Failed to parse LLM response: {str(e)}")
             raise ValueError(f"Failed to parse LLM response: {str(e)}")
     
     def validate_extraction(self, extracted_data: Dict[str, Any]) -> bool:
@@ -188,16 +376,11 @@ class DataExtractor:
         Returns:
             True if validation passes, False otherwise
         """
-        required_fields = [
-            "supplier_name", "product_code", "description", 
-            "startup_voltage", "firmware_version", "valid_from", "valid_to"
-        ]
-        
         data = extracted_data.get("data", {})
         
-        for field in required_fields:
-            if field not in data or data[field] is None:
-                logger.warning(f"Missing required field: {field}")
-                return False
+        missing = self.REQUIRED_FIELDS - {k for k, v in data.items() if v is not None}
+        if missing:
+            logger.warning("Missing required fields: %s", ", ".join(sorted(missing)))
+            return False
         
-        return True 
\ No newline at end of file
+        return True
@@ -6,19 +6,23 @@ Main script for processing solar maintenance PDFs and extracting structured data
 """
 
 import argparse
+import asyncio
 import logging
+import multiprocessing
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 from dotenv import load_dotenv
 import click
 
-from pdf_processor import PDFProcessor
-from data_extractor import DataExtractor
-from schema_validator import SchemaValidator
-from version_tracker import VersionTracker
+# Cheap to import: data_extractor defers loading anthropic to DataExtractor
+from data_extractor import DEFAULT_MODEL
+
+# Pipeline components are imported where they are used: they pull in
+# anthropic, jsonschema and pymupdf, which --help and early exits don't need
 
 # Load environment variables
 load_dotenv()
@@ -49,19 +53,56 @@ def get_pdf_files(input_dir: str) -> List[Path]:
     return pdf_files
 
 
-def process_pdfs(
+def _extract_one(pdf_path: str, cache_dir: str, digest: str) -> str:
+    """
+    Extract text from a single PDF.
+    
+    Top-level so it can be pickled and run in a worker process.
+    """
+    from pdf_processor import PDFProcessor
+    
+    return PDFProcessor(cache_dir=cache_dir).extract_text(pdf_path, digest=digest)
+
+
+async def process_pdfs(
     input_dir: str,
     output_dir: str,
     schema_path: str,
-    model: str
+    model: str,
+    concurrency: int = 20,
+    batch: bool = False,
+    cache_dir: Optional[str] = None,
+    max_chars: Optional[int] = 40_000,
+    write_individual: bool = False
 ) -> Dict[str, Any]:
-    """Process all PDFs in the input directory."""
+    """
+    Process all PDFs in the input directory.
+    
+    Files are dispatched concurrently: text extraction runs in a pool of
+    worker processes and at most ``concurrency`` LLM requests are in flight
+    at any time. With ``batch`` set, all documents are instead
+    submitted as a single Message Batch and the results dispatched once the
+    batch has ended. Extracted text and validated extractions are cached
+    under ``cache_dir`` (default ``<output_dir>/.cache``) so unchanged PDFs
+    skip both PDF parsing and the LLM. Documents longer than ``max_chars``
+    are truncated to their head and tail before prompting.
+    """
+    
+    from cache import ExtractionCache, file_digest
+    from data_extractor import DataExtractor, PROMPT_VERSION
+    from schema_validator import SchemaValidator
+    from version_tracker import VersionTracker
+    
+    cache_root = Path(cache_dir or Path(output_dir) / ".cache")
     
     # Initialize components
-    pdf_processor = PDFProcessor()
-    data_extractor = DataExtractor(model=model)
+    data_extractor = DataExtractor(model=model, max_chars=max_chars)
     schema_validator = SchemaValidator(schema_path)
-    version_tracker = VersionTracker(output_dir)
+    version_tracker = VersionTracker(output_dir, write_individual=write_individual)
+    extraction_cache = ExtractionCache(str(cache_root / "extractions"))
+    
+    # Truncation changes the prompt, so it is part of the cache key
+    prompt_version = PROMPT_VERSION + f":{max_chars}".encode()
     
     # Get PDF files
     pdf_files = get_pdf_files(input_dir)
@@ -73,44 +114,185 @@ def process_pdfs(
         "extractions": []
     }
     
-    for pdf_file in pdf_files:
+    def _failed(pdf_file: Path, error: BaseException) -> Dict[str, Any]:
+        logger.error(f"Failed to process {pdf_file.name}: {str(error)}")
+        return {
+            "file": pdf_file.name,
+            "status": "failed",
+            "error": str(error)
+        }
+    
+    def _record(
+        pdf_file: Path,
+        extracted_data: Dict[str, Any],
+        cache_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # Validate against schema
+        validated_data = schema_validator.validate(extracted_data)
+        
+        if cache_key is not None:
+            extraction_cache.put(cache_key, {
+                "data": validated_data,
+                "extras": extracted_data.get("extras", {})
+            })
+        
+        # Track version and save
+        extraction_id = version_tracker.save_extraction(
+            source_file=pdf_file.name,
+            data=validated_data,
+            extras=extracted_data.get("extras", {}),
+            llm_model=model
+        )
+        
+        logger.info(f"Successfully processed {pdf_file.name}")
+        return {
+            "file": pdf_file.name,
+            "extraction_id": extraction_id,
+            "status": "success"
+        }
+    
+    async def _cached(pdf_file: Path) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        # Hashed once per file, in a thread so large PDFs don't stall the loop
+        digest = await asyncio.to_thread(file_digest, str(pdf_file))
+        cache_key = ExtractionCache.make_key(digest, model, prompt_version)
+        cached = extraction_cache.get(cache_key)
+        
+        if cached is not None and not schema_validator.is_valid(cached.get("data", {})):
+            logger.info(f"Evicting stale cache entry for {pdf_file.name}")
+            extraction_cache.evict(cache_key)
+            cached = None
+        
+        return digest, cache_key, cached
+    
+    sem = asyncio.Semaphore(concurrency)
+    pool: Optional[ProcessPoolExecutor] = None
+    
+    async def _extract_text(pdf_file: Path, digest: str) -> str:
+        nonlocal pool
+        if pool is None:
+            # Created on the first cache miss, so fully cached runs never
+            # start workers. Spawned rather than forked: by now the event
+            # loop and the HTTP client may have threads a fork would copy
+            # mid-operation.
+            pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            pool, _extract_one, str(pdf_file), str(cache_root), digest
+        )
+    
+    async def _one(pdf_file: Path) -> Dict[str, Any]:
         logger.info(f"Processing {pdf_file.name}")
         
         try:
+            digest, cache_key, cached = await _cached(pdf_file)
+            if cached is not None:
+                logger.info(f"Using cached extraction for {pdf_file.name}")
+                return _record(pdf_file, cached)
+            
             # Extract text from PDF
-            pdf_text = pdf_processor.extract_text(str(pdf_file))
+            pdf_text = await _extract_text(pdf_file, digest)
             
             # Extract structured data using LLM
-            extracted_data = data_extractor.extract_data(pdf_text)
+            # The semaphore is held per API call, not across retry backoff
+            extracted_data = await data_extractor.extract_data_async(pdf_text, limiter=sem)
             
-            # Validate against schema
-            validated_data = schema_validator.validate(extracted_data)
+            return _record(pdf_file, extracted_data, cache_key)
             
-            # Track version and save
-            extraction_id = version_tracker.save_extraction(
-                source_file=pdf_file.name,
-                data=validated_data,
-                extras=extracted_data.get("extras", {})
-            )
+        except Exception as e:
+            return _failed(pdf_file, e)
+    
+    async def _batch() -> List[Any]:
+        outcomes: Dict[Path, Any] = {}
+        texts: Dict[str, str] = {}
+        cache_keys: Dict[str, str] = {}
+        pending: List[Tuple[Path, str]] = []
+        
+        lookups = await asyncio.gather(
+            *(_cached(pdf_file) for pdf_file in pdf_files),
+            return_exceptions=True
+        )
+        
+        for pdf_file, lookup in zip(pdf_files, lookups):
+            logger.info(f"Processing {pdf_file.name}")
+            try:
+                if isinstance(lookup, BaseException):
+                    raise lookup
+                
+                digest, cache_key, cached = lookup
+                if cached is not None:
+                    logger.info(f"Using cached extraction for {pdf_file.name}")
+                    outcomes[pdf_file] = _record(pdf_file, cached)
+                    continue
+                
+                cache_keys[pdf_file.name] = cache_key
+                pending.append((pdf_file, digest))
+            except Exception as e:
+                outcomes[pdf_file] = _failed(pdf_file, e)
+        
+        extracted_texts = await asyncio.gather(
+            *(_extract_text(pdf_file, digest) for pdf_file, digest in pending),
+            return_exceptions=True
+        )
+        
+        for (pdf_file, _), pdf_text in zip(pending, extracted_texts):
+            if isinstance(pdf_text, BaseException):
+                outcomes[pdf_file] = _failed(pdf_file, pdf_text)
+            else:
+                texts[pdf_file.name] = pdf_text
+        
+        if texts:
+            try:
+                batch_results = await asyncio.to_thread(data_extractor.extract_batch, texts)
+            except Exception as e:
+                batch_results = {name: e for name in texts}
             
+            for pdf_file, _ in pending:
+                if pdf_file.name not in texts:
+                    continue
+                extracted_data = batch_results.get(
+                    pdf_file.name, ValueError("No result returned for document")
+                )
+                if isinstance(extracted_data, BaseException):
+                    outcomes[pdf_file] = _failed(pdf_file, extracted_data)
+                    continue
+                try:
+                    outcomes[pdf_file] = _record(
+                        pdf_file, extracted_data, cache_keys[pdf_file.name]
+                    )
+                except Exception as e:
+                    outcomes[pdf_file] = _failed(pdf_file, e)
+        
+        return [outcomes[pdf_file] for pdf_file in pdf_files]
+    
+    try:
+        if batch:
+            outcomes = await _batch()
+        else:
+            outcomes = await asyncio.gather(
+                *(_one(pdf_file) for pdf_file in pdf_files),
+                return_exceptions=True
+            )
+        
+        # Refresh the human-readable snapshot once per run, not per save
+        version_tracker.save_snapshot()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        version_tracker.close()
+    
+    for pdf_file, outcome in zip(pdf_files, outcomes):
+        if isinstance(outcome, BaseException):
+            outcome = _failed(pdf_file, outcome)
+        
+        if outcome["status"] == "success":
             results["successful_extractions"] += 1
-            results["extractions"].append({
-                "file": pdf_file.name,
-                "extraction_id": extraction_id,
-                "status": "success"
-            })
-            
-            logger.info(f"Successfully processed {pdf_file.name}")
-            
-        except Exception as e:
-            logger.error(f"Failed to process {pdf_file.name}: {str(e)}")
+        else:
             results["failed_extractions"] += 1
-            results["extractions"].append({
-                "file": pdf_file.name,
-                "status": "failed",
-                "error": str(e)
-            })
-        
+        results["extractions"].append(outcome)
         results["processed_files"] += 1
     
     return results
@@ -120,8 +302,23 @@ def process_pdfs(
 @click.option('--input-dir', required=True, help='Directory containing PDF files to process')
 @click.option('--output-dir', required=True, help='Directory to save structured JSON files')
 @click.option('--schema', default='inverter_schema.json', help='Path to JSON schema file')
-@click.option('--model', default='claude-3-sonnet-20240229', help='Claude model to use')
-def main(input_dir: str, output_dir: str, schema: str, model: str):
+@click.option('--model', default=DEFAULT_MODEL, show_default=True, help='Claude model to use')
+@click.option('--concurrency', default=20, show_default=True, type=click.IntRange(min=1), help='Maximum number of concurrent LLM requests')
+@click.option('--batch', is_flag=True, help='Submit all PDFs as one Message Batch (cheaper, results arrive asynchronously)')
+@click.option('--cache-dir', default=None, help='Directory for cached text and extractions (default: <output-dir>/.cache)')
+@click.option('--write-individual', is_flag=True, help='Also write each extraction to its own <id>.json file')
+@click.option('--max-chars', default=40_000, show_default=True, type=click.IntRange(min=0), help='Longest document text sent to the LLM; longer documents keep only their head and tail (0 disables truncation)')
+def main(
+    input_dir: str,
+    output_dir: str,
+    schema: str,
+    model: str,
+    concurrency: int,
+    batch: bool,
+    cache_dir: Optional[str],
+    write_individual: bool,
+    max_chars: int
+):
     """
     Process solar maintenance PDFs and extract structured data.
     
@@ -145,7 +342,10 @@ def main(input_dir: str, output_dir: str, schema: str, model: str):
         setup_directories(output_dir)
         
         # Process PDFs
-        results = process_pdfs(input_dir, output_dir, schema, model)
+        results = asyncio.run(process_pdfs(
+            input_dir, output_dir, schema, model, concurrency, batch, cache_dir,
+            max_chars or None, write_individual
+        ))
         
         # Print summary
         logger.info("=" * 50)
@@ -4,28 +4,101 @@ PDF Processing Module
 Handles PDF text extraction and preprocessing for solar maintenance documents.
 """
 
+import functools
 import logging
+import os
+import re
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
-import pdf_parse
+import pymupdf
+
+from cache import file_digest
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever _clean_text changes so cached text is invalidated
+TEXT_VERSION = "2"
+
+# Strips null characters and normalizes carriage returns to newlines
+_TBL = str.maketrans({"\x00": None, "\r": "\n"})
+
+# Runs of whitespace, including non-breaking spaces
+_WS = re.compile(r"\s+")
+
+# Explicit page markers and fixed header/footer words. Bare numbers are kept:
+# table cells such as "150" or "2500" arrive on lines of their own.
+_SKIP = re.compile(
+    r"^(?:page(?: \d+)?(?: of(?: \d+)?)?|\d+ of \d+|confidential|internal use only)$",
+    re.IGNORECASE
+)
+
+
+def _read_text(pdf_path: Path) -> str:
+    """
+    Read the raw text of every page of a PDF.
+    
+    Not memoised: each file is read once per run and the text cache covers
+    re-runs, so keeping full texts in memory would only cost space.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Text of all pages joined by newlines
+    """
+    with pymupdf.open(pdf_path) as doc:
+        return '\n'.join(page.get_text('text') for page in doc)
+
+
+@functools.lru_cache(maxsize=128)
+def _info_cached(pdf_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Read PDF metadata; mtime and size are part of the key so edits invalidate it."""
+    with pymupdf.open(pdf_path) as doc:
+        return {
+            'numpages': doc.page_count,
+            'info': doc.metadata or {}
+        }
+
+
+def _pdf_info(pdf_path: Path) -> Dict[str, Any]:
+    """
+    Read PDF metadata, reusing the result for unchanged files.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Page count and document metadata; shared between callers and must
+        not be mutated
+    """
+    stat = pdf_path.stat()
+    return _info_cached(str(pdf_path.resolve()), stat.st_mtime_ns, stat.st_size)
+
 
 class PDFProcessor:
     """Handles PDF text extraction and preprocessing."""
     
-    def __init__(self):
-        """Initialize the PDF processor."""
-        pass
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Initialize the PDF processor.
+        
+        Args:
+            cache_dir: Directory to cache extracted text in, keyed by the
+                SHA-256 of the PDF bytes. Caching is disabled if None.
+        """
+        self.text_cache_dir = Path(cache_dir) / "text" if cache_dir else None
+        if self.text_cache_dir is not None:
+            self.text_cache_dir.mkdir(parents=True, exist_ok=True)
     
-    def extract_text(self, pdf_path: str) -> str:
+    def extract_text(self, pdf_path: str, digest: Optional[str] = None) -> str:
         """
         Extract text content from a PDF file.
         
         Args:
             pdf_path: Path to the PDF file
+            digest: Content digest of the PDF from cache.file_digest, if the
+                caller already has it; computed on demand otherwise
             
         Returns:
             Extracted text content
@@ -40,24 +113,50 @@ class PDFProcessor:
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
         
         try:
-            with open(pdf_path, 'rb') as file:
-                # Parse PDF and extract text
-                pdf_data = pdf_parse(file)
-                text = pdf_data['text']
-                
-                if not text or not text.strip():
-                    raise ValueError(f"No text content found in PDF: {pdf_path}")
-                
-                # Clean and normalize text
-                cleaned_text = self._clean_text(text)
-                
-                logger.info(f"Successfully extracted {len(cleaned_text)} characters from {pdf_path.name}")
-                return cleaned_text
-                
+            cache_path = None
+            if self.text_cache_dir is not None:
+                if digest is None:
+                    digest = file_digest(str(pdf_path))
+                cache_path = self.text_cache_dir / f"{digest}-v{TEXT_VERSION}.txt"
+                if cache_path.exists():
+                    logger.info(f"Using cached text for {pdf_path.name}")
+                    return cache_path.read_text(encoding='utf-8')
+            
+            # Parse PDF and extract text
+            text = _read_text(pdf_path)
+            
+            if not text or not text.strip():
+                raise ValueError(f"No text content found in PDF: {pdf_path}")
+            
+            # Clean and normalize text
+            cleaned_text = self._clean_text(text)
+            
+            if cache_path is not None:
+                self._write_cache(cache_path, cleaned_text)
+            
+            logger.info(f"Successfully extracted {len(cleaned_text)} characters from {pdf_path.name}")
+            return cleaned_text
+            
         except Exception as e:
             logger.error(f"Failed to extract text from {pdf_path}: {str(e)}")
             raise ValueError(f"Failed to process PDF {pdf_path}: {str(e)}")
     
+    def _write_cache(self, cache_path: Path, text: str) -> None:
+        """
+        Atomically write extracted text to the cache.
+        
+        Args:
+            cache_path: Destination cache file
+            text: Cleaned text to store
+        """
+        tmp_path = cache_path.with_suffix(".tmp")
+        
+        try:
+            tmp_path.write_text(text, encoding='utf-8')
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"Failed to cache text for {cache_path.name}: {str(e)}")
+    
     def _clean_text(self, text: str) -> str:
         """
         Clean and normalize extracted text.
@@ -68,27 +167,17 @@ class PDFProcessor:
         Returns:
             Cleaned and normalized text
         """
-        # Remove excessive whitespace
-        text = ' '.join(text.split())
-        
-        # Remove common PDF artifacts
-        text = text.replace('\x00', '')  # Null characters
-        text = text.replace('\r', '\n')  # Normalize line endings
-        
-        # Remove page numbers and headers/footers (simple heuristic)
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            # Skip lines that are likely page numbers or headers
-            if (len(line) < 3 or 
-                line.isdigit() or 
-                line.lower() in ['page', 'page of', 'confidential', 'internal use only']):
-                continue
-            cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines)
+        # Remove null characters and normalize line endings in one pass
+        text = text.translate(_TBL)
+        
+        # Normalize whitespace per line and drop empty lines and page
+        # markers or headers/footers
+        lines = (_WS.sub(' ', line).strip() for line in text.splitlines())
+        
+        return ' '.join(
+            line for line in lines
+            if line and not _SKIP.match(line)
+        )
     
     def get_pdf_info(self, pdf_path: str) -> dict:
         """
@@ -106,23 +195,24 @@ class PDFProcessor:
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
         
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_data = pdf_parse(file)
-                
-                return {
-                    'pages': pdf_data.get('numpages', 0),
-                    'info': pdf_data.get('info', {}),
-                    'file_size': pdf_path.stat().st_size,
-                    'filename': pdf_path.name
-                }
-                
+            pdf_data = _pdf_info(pdf_path)
+            
+            return {
+                'pages': pdf_data.get('numpages', 0),
+                'info': pdf_data.get('info', {}),
+                'file_size': pdf_path.stat().st_size,
+                'filename': pdf_path.name
+            }
+            
         except Exception as e:
             logger.error(f"Failed to get PDF info from {pdf_path}: {str(e)}")
             raise ValueError(f"Failed to get PDF info from {pdf_path}: {str(e)}")
     
     def validate_pdf(self, pdf_path: str) -> bool:
         """
-        Validate that a PDF file is readable and contains text.
+        Validate that a file is a readable PDF with at least one page.
+        
+        Only checks the header and opens the document; no text is extracted.
         
         Args:
             pdf_path: Path to the PDF file
@@ -131,7 +221,11 @@ class PDFProcessor:
             True if PDF is valid, False otherwise
         """
         try:
-            text = self.extract_text(pdf_path)
-            return len(text.strip()) > 0
+            with open(pdf_path, 'rb') as file:
+                if file.read(5) != b'%PDF-':
+                    return False
+            
+            with pymupdf.open(pdf_path) as doc:
+                return doc.page_count > 0
         except Exception:
             return False 
\ No newline at end of file
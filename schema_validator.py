@@ -4,17 +4,104 @@ Schema Validation Module
 Validates extracted data against JSON schema and handles data type conversions.
 """
 
-import json
+import functools
 import logging
+import re
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple
 
-from jsonschema import validate, ValidationError
+import fastjsonschema
+import orjson
+from jsonschema import ValidationError, SchemaError
+from jsonschema.validators import validator_for
 
 logger = logging.getLogger(__name__)
 
 
+def _clean_value(key: str, value: Any) -> Any:
+    """Clean a value of unknown type; returns None if it should be dropped."""
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (int, float)):
+        return value
+    if value is not None:
+        logger.warning(f"Skipping field {key} with unexpected type: {type(value)}")
+    return None
+
+
+def _clean_string(key: str, value: Any) -> Any:
+    """Clean a value for a string-typed field."""
+    if type(value) is str:
+        return value.strip() or None
+    return _clean_value(key, value)
+
+
+def _clean_number(key: str, value: Any) -> Any:
+    """Clean a value for a number-typed field."""
+    if type(value) in (int, float):
+        return value
+    return _clean_value(key, value)
+
+
+# Shape of an ISO 8601 date or date-time; rejects garbage without paying for
+# the exception fromisoformat would raise
+_ISO_RE = re.compile(
+    r'^\d{4}-\d{2}-\d{2}'
+    r'(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$'
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _is_iso_date(date_string: str) -> bool:
+    """
+    Check whether a string is an ISO 8601 date or date-time.
+    
+    Cached because documents tend to repeat the same valid_from/valid_to
+    values.
+    """
+    if not _ISO_RE.match(date_string):
+        return False
+    
+    # fromisoformat only accepts a trailing 'Z' from Python 3.11
+    if date_string.endswith('Z'):
+        date_string = date_string[:-1] + '+00:00'
+    
+    # Range checks (month 13, day 32, ...) are left to fromisoformat
+    try:
+        datetime.fromisoformat(date_string)
+        return True
+    except ValueError:
+        return False
+
+
+# Loaded schema plus its compiled validators per path, tagged with the file's
+# (mtime_ns, size) so a long-running process only re-reads and recompiles a
+# schema that changed. A changed file replaces its path's entry.
+_SCHEMA_CACHE: Dict[
+    str, Tuple[Tuple[int, int], Tuple[Dict[str, Any], Any, Callable[[Any], Any]]]
+] = {}
+
+# Cleaner to use for each JSON Schema type
+_CLEANERS: Dict[str, Callable[[str, Any], Any]] = {
+    "string": _clean_string,
+    "number": _clean_number,
+    "integer": _clean_number,
+}
+
+
+def _cleaner_for(prop: Any) -> Callable[[str, Any], Any]:
+    """
+    Pick the cleaner for a property subschema.
+    
+    Union types (["string", "null"]) and boolean subschemas get the
+    generic cleaner.
+    """
+    if isinstance(prop, dict) and isinstance(prop.get("type"), str):
+        return _CLEANERS.get(prop["type"], _clean_value)
+    return _clean_value
+
+
 class SchemaValidator:
     """Validates extracted data against JSON schema."""
     
@@ -26,36 +113,112 @@ class SchemaValidator:
             schema_path: Path to JSON schema file
         """
         self.schema_path = Path(schema_path)
-        self.schema = self._load_schema()
+        self.schema, self._validator, self._validate_fn = self._load_compiled()
+        self._required = frozenset(self.schema.get("required", ()))
+        
+        # Per-field cleaners, resolved once from the declared property types
+        self._cleaners = {
+            key: _cleaner_for(prop)
+            for key, prop in self.schema.get("properties", {}).items()
+        }
     
-    def _load_schema(self) -> Dict[str, Any]:
+    def _load_compiled(self) -> Tuple[Dict[str, Any], Any, Callable[[Any], Any]]:
         """
-        Load JSON schema from file.
+        Load and compile the schema, reusing the result for an unchanged file.
         
         Returns:
-            Loaded schema dictionary
+            Tuple of schema dictionary, jsonschema validator and compiled
+            validation function
             
         Raises:
             FileNotFoundError: If schema file doesn't exist
-            ValueError: If schema file is invalid JSON
+            ValueError: If schema file is invalid
         """
         if not self.schema_path.exists():
             raise FileNotFoundError(f"Schema file not found: {self.schema_path}")
         
+        path = str(self.schema_path.resolve())
+        stat = self.schema_path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        
+        cached = _SCHEMA_CACHE.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        schema = self._load_schema()
+        validator = self._build_validator(schema)
+        compiled = (schema, validator, self._compile_validator(schema, validator))
+        _SCHEMA_CACHE[path] = (version, compiled)
+        
+        return compiled
+    
+    def _load_schema(self) -> Dict[str, Any]:
+        """
+        Load JSON schema from file.
+        
+        Returns:
+            Loaded schema dictionary
+            
+        Raises:
+            ValueError: If schema file is invalid JSON
+        """
         try:
-            with open(self.schema_path, 'r') as f:
-                schema = json.load(f)
+            schema = orjson.loads(self.schema_path.read_bytes())
             
             logger.info(f"Successfully loaded schema from {self.schema_path}")
             return schema
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in schema file: {str(e)}")
             raise ValueError(f"Invalid JSON in schema file: {str(e)}")
         except Exception as e:
             logger.error(f"Failed to load schema: {str(e)}")
             raise ValueError(f"Failed to load schema: {str(e)}")
     
+    def _build_validator(self, schema: Dict[str, Any]):
+        """
+        Build a reusable validator for the schema's declared draft.
+        
+        Args:
+            schema: Loaded schema dictionary
+            
+        Returns:
+            jsonschema validator instance
+            
+        Raises:
+            ValueError: If the schema itself is invalid
+        """
+        validator_class = validator_for(schema)
+        
+        try:
+            validator_class.check_schema(schema)
+        except SchemaError as e:
+            logger.error(f"Invalid schema: {str(e)}")
+            raise ValueError(f"Invalid schema: {str(e)}")
+        
+        return validator_class(schema)
+    
+    def _compile_validator(self, schema: Dict[str, Any], validator) -> Callable[[Any], Any]:
+        """
+        Compile the schema into a specialised validation function.
+        
+        Falls back to the jsonschema validator if fastjsonschema does not
+        support the schema. Formats are not asserted, matching jsonschema's
+        default behaviour.
+        
+        Args:
+            schema: Loaded schema dictionary
+            validator: jsonschema validator to fall back to
+            
+        Returns:
+            Function that raises on invalid data
+        """
+        try:
+            return fastjsonschema.compile(schema, use_formats=False)
+        except fastjsonschema.JsonSchemaDefinitionException as e:
+            logger.warning(f"Falling back to jsonschema validation: {str(e)}")
+            return validator.validate
+    
     def validate(self, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Validate extracted data against schema.
@@ -77,18 +240,42 @@ class SchemaValidator:
             cleaned_data = self._clean_data(data)
             
             # Validate against schema
-            validate(instance=cleaned_data, schema=self.schema)
+            self._validate_fn(cleaned_data)
             
             logger.info("Data validation successful")
             return cleaned_data
             
-        except ValidationError as e:
+        except (fastjsonschema.JsonSchemaValueException, ValidationError) as e:
             logger.error(f"Schema validation failed: {str(e)}")
             raise ValueError(f"Data doesn't match schema: {str(e)}")
         except Exception as e:
             logger.error(f"Validation failed: {str(e)}")
             raise ValueError(f"Validation failed: {str(e)}")
     
+    def validate_bytes(self, raw: bytes) -> Dict[str, Any]:
+        """
+        Validate extracted data that is still serialised as JSON.
+        
+        Lets callers holding raw JSON (e.g. an HTTP payload) skip decoding
+        it into Python themselves first.
+        
+        Args:
+            raw: JSON-encoded extraction with a "data" object
+        
+        Returns:
+            Validated and cleaned data
+        
+        Raises:
+            ValueError: If raw is not valid JSON or doesn't match schema
+        """
+        try:
+            extracted_data = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in extracted data: {str(e)}")
+            raise ValueError(f"Invalid JSON in extracted data: {str(e)}")
+        
+        return self.validate(extracted_data)
+    
     def _clean_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Clean and normalize data before validation.
@@ -99,27 +286,14 @@ class SchemaValidator:
         Returns:
             Cleaned data
         """
-        cleaned_data = {}
+        # Bound once so the comprehension does no attribute lookups per item
+        get_cleaner = self._cleaners.get
         
-        for key, value in data.items():
-            if value is None or value == "":
-                continue
-            
-            # Clean string values
-            if isinstance(value, str):
-                cleaned_value = value.strip()
-                if cleaned_value:
-                    cleaned_data[key] = cleaned_value
-            
-            # Keep numeric values as-is
-            elif isinstance(value, (int, float)):
-                cleaned_data[key] = value
-            
-            # Skip other types
-            else:
-                logger.warning(f"Skipping field {key} with unexpected type: {type(value)}")
-        
-        return cleaned_data
+        return {
+            key: cleaned_value
+            for key, value in data.items()
+            if (cleaned_value := get_cleaner(key, _clean_value)(key, value)) is not None
+        }
     
     def validate_date_format(self, date_string: str) -> bool:
         """
@@ -131,17 +305,7 @@ class SchemaValidator:
         Returns:
             True if valid date format, False otherwise
         """
-        try:
-            # Try parsing as ISO format
-            datetime.fromisoformat(date_string.replace('Z', '+00:00'))
-            return True
-        except ValueError:
-            try:
-                # Try common date formats
-                datetime.strptime(date_string, '%Y-%m-%d')
-                return True
-            except ValueError:
-                return False
+        return _is_iso_date(date_string)
     
     def get_validation_errors(self, data: Dict[str, Any]) -> List[str]:
         """
@@ -153,15 +317,10 @@ class SchemaValidator:
         Returns:
             List of validation error messages
         """
-        errors = []
-        
-        try:
-            validate(instance=data, schema=self.schema)
-        except ValidationError as e:
-            for error in e.context:
-                errors.append(f"{error.path}: {error.message}")
-        
-        return errors
+        return [
+            f"{error.json_path}: {error.message}"
+            for error in self._validator.iter_errors(data)
+        ]
     
     def get_missing_fields(self, data: Dict[str, Any]) -> List[str]:
         """
@@ -173,14 +332,9 @@ class SchemaValidator:
         Returns:
             List of missing required field names
         """
-        required_fields = self.schema.get("required", [])
-        missing_fields = []
-        
-        for field in required_fields:
-            if field not in data or data[field] is None:
-                missing_fields.append(field)
-        
-        return missing_fields
+        return sorted(self._required.difference(
+            key for key, value in data.items() if value is not None
+        ))
     
     def is_valid(self, data: Dict[str, Any]) -> bool:
         """
@@ -192,8 +346,12 @@ class SchemaValidator:
         Returns:
             True if valid, False otherwise
         """
+        # Cheap rejection before running the full validator
+        if not self._required.issubset(data):
+            return False
+        
         try:
-            validate(instance=data, schema=self.schema)
+            self._validate_fn(data)
             return True
-        except ValidationError:
+        except (fastjsonschema.JsonSchemaValueException, ValidationError):
             return False 
\ No newline at end of file
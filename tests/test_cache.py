@@ -0,0 +1,52 @@
+"""
+Unit tests for the extraction cache.
+"""
+
+import hashlib
+
+import pytest
+
+from cache import ExtractionCache, file_digest
+
+
+class TestExtractionCache:
+    """Test extraction cache functionality."""
+    
+    @pytest.fixture(autouse=True)
+    def setup_cache(self, tmp_path):
+        """Set up test fixtures."""
+        self.cache = ExtractionCache(str(tmp_path / "cache"))
+    
+    def test_file_digest(self, tmp_path):
+        """Test file digests hash the file content."""
+        pdf_file = tmp_path / "test.pdf"
+        pdf_file.write_bytes(b"%PDF-1.4")
+        
+        assert file_digest(str(pdf_file)) == hashlib.sha256(b"%PDF-1.4").hexdigest()
+    
+    def test_make_key(self):
+        """Test cache keys depend on content, model and prompt version."""
+        key = ExtractionCache.make_key("aa", "model-a", b"1")
+        
+        assert key == ExtractionCache.make_key("aa", "model-a", b"1")
+        assert key != ExtractionCache.make_key("ab", "model-a", b"1")
+        assert key != ExtractionCache.make_key("aa", "model-b", b"1")
+        assert key != ExtractionCache.make_key("aa", "model-a", b"2")
+    
+    def test_put_and_get(self):
+        """Test cached extractions round-trip."""
+        value = {"data": {"supplier_name": "SolarTech Inc"}, "extras": {}}
+        
+        assert self.cache.get("abc") is None
+        
+        self.cache.put("abc", value)
+        
+        assert self.cache.get("abc") == value
+    
+    def test_evict(self):
+        """Test evicting a cached extraction."""
+        self.cache.put("abc", {"data": {}})
+        self.cache.evict("abc")
+        
+        assert self.cache.get("abc") is None
+        self.cache.evict("abc")  # Missing entries are ignored
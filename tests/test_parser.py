@@ -2,14 +2,28 @@
 Unit tests for parsing logic.
 """
 
+import asyncio
+
 import pytest
-from unittest.mock import Mock, patch
+import pymupdf
+from unittest.mock import AsyncMock, Mock, patch
 from pathlib import Path
 
 from pdf_processor import PDFProcessor
 from data_extractor import DataExtractor
 
 
+def _write_pdf(path: Path, text: str) -> Path:
+    """Write a single-page PDF containing the given text."""
+    doc = pymupdf.open()
+    page = doc.new_page()
+    if text:
+        page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+    return path
+
+
 class TestPDFProcessor:
     """Test PDF processing functionality."""
     
@@ -17,39 +31,56 @@ class TestPDFProcessor:
         """Set up test fixtures."""
         self.processor = PDFProcessor()
     
-    def test_extract_text_success(self):
+    def test_extract_text_success(self, tmp_path):
         """Test successful text extraction."""
-        # Mock PDF content
-        mock_pdf_data = {
-            'text': 'Sample PDF content with inverter information',
-            'numpages': 1
-        }
+        pdf_file = _write_pdf(tmp_path / "test.pdf", "Sample PDF content with inverter information")
         
-        with patch('pdf_parse') as mock_pdf_parse:
-            mock_pdf_parse.return_value = mock_pdf_data
-            
-            # Mock file operations
-            with patch('builtins.open', create=True) as mock_open:
-                mock_file = Mock()
-                mock_open.return_value.__enter__.return_value = mock_file
-                
-                result = self.processor.extract_text('test.pdf')
-                
-                assert result == 'Sample PDF content with inverter information'
-    
-    def test_extract_text_no_content(self):
+        result = self.processor.extract_text(str(pdf_file))
+        
+        assert result == 'Sample PDF content with inverter information'
+    
+    def test_extract_text_no_content(self, tmp_path):
         """Test handling of PDF with no text content."""
-        mock_pdf_data = {'text': '', 'numpages': 1}
+        pdf_file = _write_pdf(tmp_path / "empty.pdf", "")
         
-        with patch('pdf_parse') as mock_pdf_parse:
-            mock_pdf_parse.return_value = mock_pdf_data
+        with pytest.raises(ValueError, match="No text content found"):
+            self.processor.extract_text(str(pdf_file))
+    
+    def test_extract_text_uses_text_cache(self, tmp_path):
+        """Test extracted text is cached by PDF content."""
+        pdf_file = _write_pdf(tmp_path / "test.pdf", "Cached inverter text")
+        processor = PDFProcessor(cache_dir=str(tmp_path / "cache"))
+        
+        first = processor.extract_text(str(pdf_file))
+        
+        with patch('pdf_processor._read_text') as mock_read:
+            second = processor.extract_text(str(pdf_file))
             
-            with patch('builtins.open', create=True) as mock_open:
-                mock_file = Mock()
-                mock_open.return_value.__enter__.return_value = mock_file
-                
-                with pytest.raises(ValueError, match="No text content found"):
-                    self.processor.extract_text('test.pdf')
+            assert first == second == 'Cached inverter text'
+            mock_read.assert_not_called()
+    
+    def test_get_pdf_info_memoised(self, tmp_path):
+        """Test get_pdf_info reads an unchanged PDF's metadata only once."""
+        pdf_file = _write_pdf(tmp_path / "test.pdf", "Inverter text")
+        
+        with patch('pdf_processor.pymupdf.open', wraps=pymupdf.open) as mock_open:
+            first = self.processor.get_pdf_info(str(pdf_file))
+            second = self.processor.get_pdf_info(str(pdf_file))
+            
+            assert first['pages'] == second['pages'] == 1
+            assert mock_open.call_count == 1
+    
+    def test_validate_pdf(self, tmp_path):
+        """Test PDF validation without extracting text."""
+        pdf_file = _write_pdf(tmp_path / "test.pdf", "Inverter text")
+        not_pdf = tmp_path / "notes.pdf"
+        not_pdf.write_text("not a pdf")
+        
+        with patch('pdf_processor._read_text') as mock_read:
+            assert self.processor.validate_pdf(str(pdf_file)) is True
+            assert self.processor.validate_pdf(str(not_pdf)) is False
+            assert self.processor.validate_pdf(str(tmp_path / "missing.pdf")) is False
+            mock_read.assert_not_called()
     
     def test_clean_text(self):
         """Test text cleaning functionality."""
@@ -66,6 +97,13 @@ class TestPDFProcessor:
         assert '\x00' not in cleaned
         assert 'Page 1' not in cleaned
         assert 'Page 2' not in cleaned
+    
+    def test_clean_text_keeps_values(self):
+        """Test value-only lines survive while page markers are dropped."""
+        raw_text = "Startup Voltage:\n150\nUnit price\n2500\nCurrency\nEU\n3 of 12\nA\xa0\xa0B"
+        cleaned = self.processor._clean_text(raw_text)
+        
+        assert cleaned == "Startup Voltage: 150 Unit price 2500 Currency EU A B"
 
 
 class TestDataExtractor:
@@ -111,6 +149,126 @@ class TestDataExtractor:
             assert result['data']['product_code'] == "INV-5000"
             assert result['data']['startup_voltage'] == "150V"
     
+    def test_extract_data_retries_invalid_json(self):
+        """Test invalid JSON is fed back to the model and retried."""
+        bad_response = Mock()
+        bad_response.content = [Mock(text='{"supplier_name": ')]
+        good_response = Mock()
+        good_response.content = [Mock(text='{"supplier_name": "SolarTech Inc"}')]
+        
+        with patch.object(self.extractor.client.messages, 'create') as mock_create, \
+                patch('data_extractor.time.sleep'):
+            mock_create.side_effect = [bad_response, good_response]
+            
+            result = self.extractor.extract_data("SolarTech Inc")
+            
+            assert result['data']['supplier_name'] == "SolarTech Inc"
+            assert mock_create.call_count == 2
+            messages = mock_create.call_args.kwargs['messages']
+            assert messages[1] == {"role": "assistant", "content": '{"supplier_name": '}
+            assert "Fix and return valid JSON only" in messages[2]['content']
+    
+    def test_extract_data_gives_up_after_retries(self):
+        """Test extraction fails once retries are exhausted."""
+        bad_response = Mock()
+        bad_response.content = [Mock(text='not json')]
+        
+        with patch.object(self.extractor.client.messages, 'create') as mock_create, \
+                patch('data_extractor.time.sleep'):
+            mock_create.return_value = bad_response
+            
+            with pytest.raises(ValueError, match="LLM extraction failed"):
+                self.extractor.extract_data("SolarTech Inc")
+            
+            assert mock_create.call_count == self.extractor.max_retries + 1
+    
+    @pytest.mark.asyncio
+    async def test_extract_data_async_success(self):
+        """Test successful data extraction with the async client."""
+        mock_response = Mock()
+        mock_response.content = [Mock()]
+        mock_response.content[0].text = '{"supplier_name": "SolarTech Inc", "extras": {}}'
+        
+        with patch.object(
+            self.extractor.async_client.messages, 'create', new_callable=AsyncMock
+        ) as mock_create:
+            mock_create.return_value = mock_response
+            
+            result = await self.extractor.extract_data_async("SolarTech Inc")
+            
+            assert result['data']['supplier_name'] == "SolarTech Inc"
+            mock_create.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_extract_data_async_releases_limiter_during_backoff(self):
+        """Test the limiter is held per API call, not across the retry sleep."""
+        limiter = asyncio.Semaphore(1)
+        bad = Mock(content=[Mock(text="not json")])
+        good = Mock(content=[Mock(text='{"supplier_name": "SolarTech Inc"}')])
+        
+        async def fake_sleep(delay):
+            assert not limiter.locked()
+        
+        with patch.object(
+            self.extractor.async_client.messages, 'create', new_callable=AsyncMock
+        ) as mock_create, patch('data_extractor.asyncio.sleep', fake_sleep):
+            mock_create.side_effect = [bad, good]
+            
+            result = await self.extractor.extract_data_async("SolarTech Inc", limiter=limiter)
+            
+            assert result['data']['supplier_name'] == "SolarTech Inc"
+            assert mock_create.await_count == 2
+    
+    def test_extract_batch(self):
+        """Test batch extraction maps results back to source files."""
+        submitted = Mock(id="batch_1", processing_status="in_progress")
+        ended = Mock(id="batch_1", processing_status="ended")
+        
+        succeeded = Mock(custom_id="doc-0")
+        succeeded.result.type = "succeeded"
+        succeeded.result.message.content = [Mock(text='{"supplier_name": "SolarTech Inc"}')]
+        errored = Mock(custom_id="doc-1")
+        errored.result.type = "errored"
+        
+        batches = Mock()
+        batches.create.return_value = submitted
+        batches.retrieve.return_value = ended
+        batches.results.return_value = iter([succeeded, errored])
+        
+        with patch.object(self.extractor.client.messages, 'batches', batches), \
+                patch('data_extractor.time.sleep'):
+            results = self.extractor.extract_batch({"a.pdf": "text a", "b.pdf": "text b"})
+        
+        requests = batches.create.call_args.kwargs['requests']
+        assert [r['custom_id'] for r in requests] == ["doc-0", "doc-1"]
+        assert results["a.pdf"]['data']['supplier_name'] == "SolarTech Inc"
+        assert isinstance(results["b.pdf"], ValueError)
+    
+    def test_create_extraction_prompt_static_prefix(self):
+        """Test the static instructions are a shared block ahead of the document."""
+        first = self.extractor._create_extraction_prompt("Document one")
+        second = self.extractor._create_extraction_prompt("Document two")
+        
+        assert first[0] == second[0]
+        assert "Return format:" in first[0]['text']
+        assert first[1]['text'] == "Document text:\nDocument one"
+    
+    def test_create_extraction_prompt_truncates_long_text(self):
+        """Test long documents keep only their head and tail."""
+        self.extractor.max_chars = 20
+        pdf_text = "H" * 10 + "M" * 100 + "T" * 10
+        
+        document = self.extractor._create_extraction_prompt(pdf_text)[1]['text']
+        
+        assert "H" * 10 + "\n...[truncated]...\n" + "T" * 10 in document
+        assert "M" not in document
+        
+        # With max_chars below 2 nothing of the document survives
+        self.extractor.max_chars = 1
+        document = self.extractor._create_extraction_prompt(pdf_text)[1]['text']
+        
+        assert document == "Document text:\n\n...[truncated]...\n"
+    
     def test_parse_llm_response_with_markdown(self):
         """Test parsing LLM response with markdown formatting."""
         response_text = "```json\n{\"supplier_name\": \"Test\"}\n```"
@@ -119,6 +277,14 @@ class TestDataExtractor:
         
         assert result['data']['supplier_name'] == "Test"
     
+    def test_parse_llm_response_with_bare_fence(self):
+        """Test parsing LLM response wrapped in an untagged code fence."""
+        response_text = "  ```\n{\"supplier_name\": \"Test\"}\n```  "
+        
+        result = self.extractor._parse_llm_response(response_text)
+        
+        assert result['data']['supplier_name'] == "Test"
+    
     def test_validate_extraction_success(self):
         """Test successful extraction validation."""
         extracted_data = {
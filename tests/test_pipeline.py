@@ -0,0 +1,130 @@
+"""
+Unit tests for the processing pipeline.
+"""
+
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+from cache import ExtractionCache
+from main import process_pdfs
+from test_parser import _write_pdf
+
+SCHEMA_PATH = str(Path(__file__).resolve().parent.parent / "inverter_schema.json")
+
+VALID_DATA = {
+    "supplier_name": "SolarTech Inc",
+    "product_code": "INV-5000",
+    "description": "5000W Inverter",
+    "startup_voltage": "150V",
+    "firmware_version": "v2.1.4",
+    "valid_from": "2024-01-01T00:00:00Z",
+    "valid_to": "2024-12-31T23:59:59Z"
+}
+
+
+class StubExtractor:
+    """Stands in for DataExtractor; documents mentioning 'broken' fail."""
+    
+    calls = []
+    
+    def __init__(self, model=None, max_chars=None):
+        pass
+    
+    async def extract_data_async(self, pdf_text, limiter=None):
+        StubExtractor.calls.append(pdf_text)
+        if "broken" in pdf_text:
+            raise ValueError("LLM extraction failed: unparseable response")
+        return {"data": dict(VALID_DATA), "extras": {"source": pdf_text}}
+    
+    def extract_batch(self, texts):
+        StubExtractor.calls.extend(texts.values())
+        return {
+            name: {"data": dict(VALID_DATA), "extras": {}}
+            for name, text in texts.items()
+            if "missing" not in text
+        }
+
+
+class TestProcessPdfs:
+    """Test the end-to-end processing pipeline."""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        """Set up test fixtures."""
+        self.input_dir = tmp_path / "input"
+        self.output_dir = tmp_path / "output"
+        self.input_dir.mkdir()
+        
+        StubExtractor.calls = []
+        with patch('data_extractor.DataExtractor', StubExtractor):
+            yield
+    
+    async def _run(self, **kwargs):
+        return await process_pdfs(
+            str(self.input_dir), str(self.output_dir), SCHEMA_PATH, "test-model",
+            **kwargs
+        )
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_with_failing_file(self):
+        """Test concurrent processing keeps results in input order."""
+        for name in ("a", "b", "c"):
+            text = "broken report" if name == "b" else f"Inverter report {name}"
+            _write_pdf(self.input_dir / f"{name}.pdf", text)
+        
+        results = await self._run(concurrency=2)
+        
+        assert results["processed_files"] == 3
+        assert results["successful_extractions"] == 2
+        assert results["failed_extractions"] == 1
+        
+        statuses = {outcome["file"]: outcome["status"] for outcome in results["extractions"]}
+        assert statuses == {"a.pdf": "success", "b.pdf": "failed", "c.pdf": "success"}
+        assert [outcome["file"] for outcome in results["extractions"]] == [
+            pdf_file.name for pdf_file in self.input_dir.glob("*.pdf")
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_rerun_served_from_cache(self):
+        """Test a second run over unchanged PDFs makes no LLM calls."""
+        _write_pdf(self.input_dir / "a.pdf", "Inverter report a")
+        _write_pdf(self.input_dir / "b.pdf", "Inverter report b")
+        
+        await self._run()
+        assert len(StubExtractor.calls) == 2
+        
+        results = await self._run()
+        
+        assert len(StubExtractor.calls) == 2
+        assert results["successful_extractions"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_stale_cache_entry_evicted(self):
+        """Test a cached extraction that no longer validates is re-extracted."""
+        _write_pdf(self.input_dir / "a.pdf", "Inverter report a")
+        
+        await self._run()
+        
+        cache_dir = self.output_dir / ".cache" / "extractions"
+        cache = ExtractionCache(str(cache_dir))
+        for entry in cache_dir.glob("*.json"):
+            cache.put(entry.stem, {"data": {"supplier_name": "Stale"}, "extras": {}})
+        
+        results = await self._run()
+        
+        assert len(StubExtractor.calls) == 2
+        assert results["successful_extractions"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_batch_with_missing_result(self):
+        """Test a document missing from the batch results is reported as failed."""
+        _write_pdf(self.input_dir / "a.pdf", "Inverter report a")
+        _write_pdf(self.input_dir / "b.pdf", "missing report")
+        
+        results = await self._run(batch=True)
+        
+        statuses = {outcome["file"]: outcome for outcome in results["extractions"]}
+        assert statuses["a.pdf"]["status"] == "success"
+        assert statuses["b.pdf"]["status"] == "failed"
+        assert "No result" in statuses["b.pdf"]["error"]
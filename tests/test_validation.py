@@ -4,49 +4,55 @@ Unit tests for validation logic.
 
 import pytest
 import json
-import tempfile
-from pathlib import Path
+import os
 from unittest.mock import Mock, patch
 
-from schema_validator import SchemaValidator
-from version_tracker import VersionTracker
+from schema_validator import SchemaValidator, _SCHEMA_CACHE
+from version_tracker import VersionTracker, iter_extractions
+
+
+@pytest.fixture(scope="class")
+def schema_file(tmp_path_factory):
+    """Write the test schema once per test class."""
+    schema_file = tmp_path_factory.mktemp("schema") / "test_schema.json"
+    
+    schema = {
+        "type": "object",
+        "properties": {
+            "supplier_name": {"type": "string"},
+            "product_code": {"type": "string"},
+            "description": {"type": "string"},
+            "startup_voltage": {"type": "string"},
+            "firmware_version": {"type": "string"},
+            "valid_from": {"type": "string", "format": "date-time"},
+            "valid_to": {"type": "string", "format": "date-time"}
+        },
+        "required": [
+            "supplier_name", "product_code", "description",
+            "startup_voltage", "firmware_version", "valid_from", "valid_to"
+        ]
+    }
+    
+    with open(schema_file, 'w') as f:
+        json.dump(schema, f)
+    
+    return schema_file
+
+
+@pytest.fixture(scope="class")
+def validator(schema_file):
+    """Compile the test schema once per test class."""
+    return SchemaValidator(str(schema_file))
 
 
 class TestSchemaValidator:
     """Test schema validation functionality."""
     
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def setup(self, schema_file, validator):
         """Set up test fixtures."""
-        # Create temporary schema file
-        self.temp_dir = tempfile.mkdtemp()
-        self.schema_file = Path(self.temp_dir) / "test_schema.json"
-        
-        schema = {
-            "type": "object",
-            "properties": {
-                "supplier_name": {"type": "string"},
-                "product_code": {"type": "string"},
-                "description": {"type": "string"},
-                "startup_voltage": {"type": "string"},
-                "firmware_version": {"type": "string"},
-                "valid_from": {"type": "string", "format": "date-time"},
-                "valid_to": {"type": "string", "format": "date-time"}
-            },
-            "required": [
-                "supplier_name", "product_code", "description",
-                "startup_voltage", "firmware_version", "valid_from", "valid_to"
-            ]
-        }
-        
-        with open(self.schema_file, 'w') as f:
-            json.dump(schema, f)
-        
-        self.validator = SchemaValidator(str(self.schema_file))
-    
-    def teardown_method(self):
-        """Clean up test fixtures."""
-        import shutil
-        shutil.rmtree(self.temp_dir)
+        self.schema_file = schema_file
+        self.validator = validator
     
     def test_validate_success(self):
         """Test successful validation."""
@@ -81,6 +87,67 @@ class TestSchemaValidator:
         with pytest.raises(ValueError, match="Data doesn't match schema"):
             self.validator.validate(extracted_data)
     
+    def test_validate_bytes(self):
+        """Test validation of raw JSON bytes."""
+        raw = json.dumps({
+            "data": {
+                "supplier_name": " SolarTech Inc ",
+                "product_code": "INV-5000",
+                "description": "5000W Inverter",
+                "startup_voltage": "150V",
+                "firmware_version": "v2.1.4",
+                "valid_from": "2024-01-01T00:00:00Z",
+                "valid_to": "2024-12-31T23:59:59Z"
+            }
+        }).encode()
+        
+        result = self.validator.validate_bytes(raw)
+        assert result["supplier_name"] == "SolarTech Inc"
+        
+        with pytest.raises(ValueError, match="Invalid JSON"):
+            self.validator.validate_bytes(b"{not json")
+    
+    def test_schema_cache(self, tmp_path):
+        """Test compiled schemas are shared until the file changes."""
+        other = SchemaValidator(str(self.schema_file))
+        assert other._validate_fn is self.validator._validate_fn
+        
+        # Edit a copy; the class-wide schema file is shared with other tests
+        schema_file = tmp_path / "test_schema.json"
+        schema_file.write_bytes(self.schema_file.read_bytes())
+        validator = SchemaValidator(str(schema_file))
+        
+        # Same mtime, different size: still detected as a change
+        mtime_ns = schema_file.stat().st_mtime_ns
+        schema = dict(validator.schema, required=["supplier_name"])
+        with open(schema_file, 'w') as f:
+            json.dump(schema, f)
+        os.utime(schema_file, ns=(mtime_ns, mtime_ns))
+        
+        reloaded = SchemaValidator(str(schema_file))
+        assert reloaded._validate_fn is not validator._validate_fn
+        assert reloaded.is_valid({"supplier_name": "SolarTech Inc"}) is True
+        
+        # The changed file replaced its path's entry
+        assert _SCHEMA_CACHE[str(schema_file.resolve())][1][2] is reloaded._validate_fn
+    
+    def test_union_and_boolean_property_schemas(self, tmp_path):
+        """Test properties with a list of types or a boolean subschema."""
+        schema_file = tmp_path / "union_schema.json"
+        with open(schema_file, 'w') as f:
+            json.dump({
+                "type": "object",
+                "properties": {
+                    "supplier_name": {"type": ["string", "null"]},
+                    "notes": True
+                }
+            }, f)
+        
+        validator = SchemaValidator(str(schema_file))
+        result = validator.validate({"data": {"supplier_name": " SolarTech Inc ", "notes": "x"}})
+        
+        assert result == {"supplier_name": "SolarTech Inc", "notes": "x"}
+    
     def test_clean_data(self):
         """Test data cleaning functionality."""
         raw_data = {
@@ -138,6 +205,18 @@ class TestSchemaValidator:
         assert "supplier_name" not in missing
         assert "product_code" not in missing
     
+    def test_get_validation_errors(self):
+        """Test every validation error is reported."""
+        data = {
+            "supplier_name": 123,
+            "product_code": "INV-5000"
+        }
+        
+        errors = self.validator.get_validation_errors(data)
+        
+        assert any("$.supplier_name" in error for error in errors)
+        assert any("'description' is a required property" in error for error in errors)
+    
     def test_is_valid(self):
         """Test validity check."""
         valid_data = {
@@ -163,15 +242,11 @@ class TestSchemaValidator:
 class TestVersionTracker:
     """Test version tracking functionality."""
     
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
         """Set up test fixtures."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.tracker = VersionTracker(self.temp_dir)
-    
-    def teardown_method(self):
-        """Clean up test fixtures."""
-        import shutil
-        shutil.rmtree(self.temp_dir)
+        self.output_dir = tmp_path
+        self.tracker = VersionTracker(str(self.output_dir))
     
     def test_save_extraction(self):
         """Test saving extraction with version tracking."""
@@ -200,6 +275,15 @@ class TestVersionTracker:
         assert extractions[0]["source_file"] == "test.pdf"
         assert extractions[0]["data"] == data
     
+    def test_individual_extraction_files(self):
+        """Test per-extraction files are only written when enabled."""
+        extraction_id = self.tracker.save_extraction("test.pdf", {"supplier_name": "Test"})
+        assert not (self.output_dir / f"{extraction_id}.json").exists()
+        
+        tracker = VersionTracker(str(self.output_dir), write_individual=True)
+        extraction_id = tracker.save_extraction("test.pdf", {"supplier_name": "Test"})
+        assert (self.output_dir / f"{extraction_id}.json").exists()
+    
     def test_version_tracking(self):
         """Test version tracking for multiple extractions."""
         data = {"supplier_name": "Test"}
@@ -213,6 +297,87 @@ class TestVersionTracker:
         extraction = self.tracker.get_extraction_by_id(extraction_id)
         assert extraction["version"] == 2
     
+    def test_version_tracking_after_reload(self):
+        """Test versions and lookups survive reloading from disk."""
+        data = {"supplier_name": "Test"}
+        
+        first_id = self.tracker.save_extraction("test.pdf", data)
+        
+        reloaded = VersionTracker(str(self.output_dir))
+        second_id = reloaded.save_extraction("test.pdf", data)
+        
+        assert reloaded.get_extraction_by_id(first_id)["version"] == 1
+        assert reloaded.get_extraction_by_id(second_id)["version"] == 2
+    
+    def test_iter_extractions(self):
+        """Test streaming extractions from the log."""
+        assert list(iter_extractions(str(self.output_dir))) == []
+        
+        first_id = self.tracker.save_extraction("test1.pdf", {"supplier_name": "Test1"})
+        second_id = self.tracker.save_extraction("test2.pdf", {"supplier_name": "Test2"})
+        
+        records = list(iter_extractions(str(self.output_dir)))
+        assert [record["id"] for record in records] == [first_id, second_id]
+    
+    def test_created_at_survives_reload(self):
+        """Test the log keeps its creation time across runs."""
+        self.tracker.save_extraction("test.pdf", {"supplier_name": "Test"})
+        self.tracker.close()
+        created_at = self.tracker.extractions["created_at"]
+        
+        reloaded = VersionTracker(str(self.output_dir))
+        reloaded.save_snapshot()
+        
+        assert reloaded.extractions["created_at"] == created_at
+        snapshot = json.loads((self.output_dir / "extractions.json").read_text())
+        assert snapshot["created_at"] == created_at
+        assert len(reloaded.get_all_extractions()) == 1
+    
+    def test_torn_final_log_line(self):
+        """Test a half-written last record doesn't discard the history."""
+        for _ in range(3):
+            self.tracker.save_extraction("test.pdf", {"supplier_name": "Test"})
+        self.tracker.close()
+        with open(self.output_dir / "extractions.jsonl", 'ab') as f:
+            f.write(b'{"id": "torn", "source_fi')
+        
+        reloaded = VersionTracker(str(self.output_dir))
+        assert len(reloaded.get_all_extractions()) == 3
+        
+        reloaded.save_extraction("test.pdf", {"supplier_name": "Test"})
+        reloaded.save_snapshot()
+        reloaded.close()
+        
+        latest = VersionTracker(str(self.output_dir))
+        assert latest.get_latest_extraction("test.pdf")["version"] == 4
+        assert len(latest.get_all_extractions()) == 4
+    
+    def test_failed_load_keeps_snapshot(self, tmp_path):
+        """Test an unreadable log never leads to the snapshot being rewritten."""
+        (tmp_path / "extractions.jsonl").mkdir()
+        snapshot = tmp_path / "extractions.json"
+        snapshot.write_text('{"created_at": "2024-01-01", "extractions": []}')
+        
+        tracker = VersionTracker(str(tmp_path))
+        tracker.save_snapshot()
+        
+        assert snapshot.read_text() == '{"created_at": "2024-01-01", "extractions": []}'
+    
+    def test_load_legacy_extractions_file(self):
+        """Test a legacy extractions.json is migrated to the log."""
+        self.tracker.save_extraction("test.pdf", {"supplier_name": "Test"})
+        self.tracker.save_snapshot()
+        self.tracker.close()
+        (self.output_dir / "extractions.jsonl").unlink()
+        
+        migrated = VersionTracker(str(self.output_dir))
+        migrated.close()
+        reloaded = VersionTracker(str(self.output_dir))
+        
+        assert reloaded.extractions["created_at"] == self.tracker.extractions["created_at"]
+        assert len(reloaded.get_all_extractions()) == 1
+        assert reloaded.get_latest_extraction("test.pdf")["version"] == 1
+    
     def test_get_extraction_history(self):
         """Test getting extraction history."""
         data = {"supplier_name": "Test"}
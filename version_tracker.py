@@ -4,60 +4,201 @@ Version Tracking Module
 Handles versioning and audit trails for extracted data with change tracking.
 """
 
-import json
 import logging
+import os
 import uuid
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
 
+def _utc_now_iso() -> str:
+    """Current time as a timezone-aware ISO 8601 UTC timestamp."""
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+@dataclass(slots=True)
+class Extraction:
+    """
+    In-memory extraction record.
+    
+    Slots keep the per-record footprint small for long histories. Records
+    are converted to plain dicts wherever they leave the tracker; orjson
+    serialises the dataclass directly, in field order.
+    """
+    id: str
+    source_file: str
+    extracted_at: str
+    version: int
+    data: Dict[str, Any]
+    extras: Dict[str, Any]
+    metadata: Dict[str, Any]
+    
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any]) -> "Extraction":
+        """Build an extraction from a decoded JSON record."""
+        return cls(
+            id=record["id"],
+            source_file=record["source_file"],
+            extracted_at=record["extracted_at"],
+            version=record["version"],
+            data=record.get("data", {}),
+            extras=record.get("extras", {}),
+            metadata=record.get("metadata", {})
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the extraction as a plain dict."""
+        return {
+            "id": self.id,
+            "source_file": self.source_file,
+            "extracted_at": self.extracted_at,
+            "version": self.version,
+            "data": self.data,
+            "extras": self.extras,
+            "metadata": self.metadata
+        }
+
+
+def _iter_log_records(log_file: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the decoded records of an extractions log, header included.
+    
+    Lines that fail to decode, such as a final line torn by a crash
+    mid-write, are skipped with a warning rather than failing the read.
+    """
+    with open(log_file, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Skipping unreadable line {line_number} of {log_file}: {str(e)}")
+
+
+def iter_extractions(output_dir: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream extraction records from an output directory's extractions log.
+    
+    Only one record is held in memory at a time, so callers that just
+    aggregate over the history need not load all of it.
+    
+    Args:
+        output_dir: Directory containing extractions.jsonl
+    
+    Yields:
+        Extraction records in the order they were saved
+    """
+    log_file = Path(output_dir) / "extractions.jsonl"
+    if not log_file.exists():
+        return
+    
+    for record in _iter_log_records(log_file):
+        # The first line is a header holding the log's created_at
+        if "created_at" not in record:
+            yield record
+
+
 class VersionTracker:
     """Tracks versions of extracted data with audit trails."""
     
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, write_individual: bool = False):
         """
         Initialize the version tracker.
         
         Args:
             output_dir: Directory to save versioned data
+            write_individual: Also write each extraction to its own
+                {id}.json file
         """
         self.output_dir = Path(output_dir)
+        self.write_individual = write_individual
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
-        # File to store all extractions
+        # Append-only log of all extractions, one JSON record per line
+        self.log_file = self.output_dir / "extractions.jsonl"
+        self._log_fh = None
+        
+        # Pretty-printed snapshot written by save_snapshot; never rewritten
+        # if the existing history could not be loaded
         self.extractions_file = self.output_dir / "extractions.json"
+        self._load_failed = False
         self.extractions = self._load_extractions()
+        
+        # Lookup indexes derived from the extractions list
+        self._version_by_file: Dict[str, int] = {}
+        self._by_id: Dict[str, Extraction] = {}
+        self._by_file: Dict[str, List[Extraction]] = {}
+        for extraction in self.extractions["extractions"]:
+            self._index(extraction)
+        
+        # Versions only grow, so saves keep each bucket ordered by version;
+        # sort once in case a hand-edited log is out of order
+        for bucket in self._by_file.values():
+            bucket.sort(key=lambda x: x.version)
     
     def _load_extractions(self) -> Dict[str, Any]:
         """
         Load existing extractions from file.
         
+        Reads the extractions log; a legacy extractions.json without a log
+        is loaded and migrated to the log.
+        
         Returns:
             Dictionary containing all extractions
         """
-        if self.extractions_file.exists():
+        extractions = {
+            "created_at": _utc_now_iso(),
+            "extractions": []
+        }
+        
+        if self.log_file.exists():
             try:
-                with open(self.extractions_file, 'r') as f:
-                    extractions = json.load(f)
-                logger.info(f"Loaded {len(extractions.get('extractions', []))} existing extractions")
-                return extractions
+                for record in _iter_log_records(self.log_file):
+                    if "created_at" in record:
+                        extractions["created_at"] = record["created_at"]
+                        continue
+                    try:
+                        extractions["extractions"].append(Extraction.from_dict(record))
+                    except (KeyError, TypeError) as e:
+                        logger.warning(f"Skipping incomplete extraction record: {str(e)}")
+                logger.info(f"Loaded {len(extractions['extractions'])} existing extractions")
             except Exception as e:
+                self._load_failed = True
                 logger.warning(f"Failed to load existing extractions: {str(e)}")
         
-        # Initialize new extractions structure
-        return {
-            "created_at": datetime.utcnow().isoformat(),
-            "extractions": []
-        }
+        elif self.extractions_file.exists():
+            try:
+                legacy = orjson.loads(self.extractions_file.read_bytes())
+                legacy["extractions"] = [
+                    Extraction.from_dict(record)
+                    for record in legacy.get("extractions", [])
+                ]
+                legacy.setdefault("created_at", extractions["created_at"])
+                extractions = legacy
+                logger.info(f"Loaded {len(extractions['extractions'])} existing extractions")
+                
+                self._log_fh = self._open_log(extractions["created_at"])
+                for extraction in extractions["extractions"]:
+                    self._append_extraction(extraction)
+            except Exception as e:
+                self._load_failed = True
+                logger.warning(f"Failed to load existing extractions: {str(e)}")
+        
+        return extractions
     
     def save_extraction(
         self, 
         source_file: str, 
         data: Dict[str, Any], 
-        extras: Dict[str, Any] = None
+        extras: Dict[str, Any] = None,
+        llm_model: Optional[str] = None
     ) -> str:
         """
         Save a new extraction with version tracking.
@@ -66,36 +207,40 @@ class VersionTracker:
             source_file: Name of the source PDF file
             data: Validated extracted data
             extras: Additional unmapped data
+            llm_model: Claude model that produced the extraction; stored as
+                null if not given
             
         Returns:
             Unique extraction ID
         """
-        extraction_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
+        extraction_id = uuid.uuid4().hex
+        timestamp = _utc_now_iso()
         
         # Create extraction record
-        extraction = {
-            "id": extraction_id,
-            "source_file": source_file,
-            "extracted_at": timestamp,
-            "version": self._get_next_version(source_file),
-            "data": data,
-            "extras": extras or {},
-            "metadata": {
+        extraction = Extraction(
+            id=extraction_id,
+            source_file=source_file,
+            extracted_at=timestamp,
+            version=self._get_next_version(source_file),
+            data=data,
+            extras=extras or {},
+            metadata={
                 "file_size": 0,  # Could be enhanced to get actual file size
                 "processing_time": 0,  # Could be enhanced to track processing time
-                "llm_model": "claude-3-sonnet-20240229"  # Could be made configurable
+                "llm_model": llm_model
             }
-        }
+        )
         
         # Add to extractions list
         self.extractions["extractions"].append(extraction)
+        self._index(extraction)
         
-        # Save to file
-        self._save_extractions()
+        # Append to the extractions log
+        self._append_extraction(extraction)
         
-        # Also save individual extraction file
-        self._save_individual_extraction(extraction)
+        # Optionally save individual extraction file
+        if self.write_individual:
+            self._save_individual_extraction(extraction)
         
         logger.info(f"Saved extraction {extraction_id} for {source_file}")
         return extraction_id
@@ -110,35 +255,100 @@ class VersionTracker:
         Returns:
             Next version number
         """
-        existing_versions = [
-            ext["version"] for ext in self.extractions["extractions"]
-            if ext["source_file"] == source_file
-        ]
+        return self._version_by_file.get(source_file, 0) + 1
+    
+    def _index(self, extraction: Extraction) -> None:
+        """
+        Add an extraction to the lookup indexes.
+        
+        Args:
+            extraction: Extraction record to index
+        """
+        source_file = extraction.source_file
+        
+        self._version_by_file[source_file] = max(
+            self._version_by_file.get(source_file, 0), extraction.version
+        )
+        self._by_id[extraction.id] = extraction
+        self._by_file.setdefault(source_file, []).append(extraction)
+    
+    def _open_log(self, created_at: str):
+        """
+        Open the extractions log for appending.
+        
+        A new log starts with a header record so created_at survives
+        across runs. A log whose last line was torn by a crash is first
+        terminated, so the next record starts on a line of its own.
+        
+        Args:
+            created_at: Creation time recorded in a new log's header
+            
+        Returns:
+            Binary file handle positioned at the end of the log
+        """
+        size = self.log_file.stat().st_size if self.log_file.exists() else 0
+        
+        torn = False
+        if size:
+            with open(self.log_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        
+        fh = open(self.log_file, 'ab')
+        if not size:
+            fh.write(orjson.dumps({"created_at": created_at}) + b"\n")
+        elif torn:
+            fh.write(b"\n")
+        return fh
+    
+    def _append_extraction(self, extraction: Extraction) -> None:
+        """
+        Append a single extraction to the extractions log.
         
-        return max(existing_versions, default=0) + 1
+        Args:
+            extraction: Extraction record to append
+        """
+        try:
+            if self._log_fh is None:
+                self._log_fh = self._open_log(self.extractions["created_at"])
+            self._log_fh.write(orjson.dumps(extraction) + b"\n")
+            self._log_fh.flush()
+        except Exception as e:
+            logger.error(f"Failed to save extractions: {str(e)}")
+            raise ValueError(f"Failed to save extractions: {str(e)}")
     
-    def _save_extractions(self) -> None:
-        """Save all extractions to file."""
+    def save_snapshot(self) -> None:
+        """Write all extractions to the pretty-printed extractions.json."""
+        if self._load_failed:
+            logger.error("Not rewriting extractions snapshot: existing extractions failed to load")
+            return
+        
         try:
-            with open(self.extractions_file, 'w') as f:
-                json.dump(self.extractions, f, indent=2)
+            with open(self.extractions_file, 'wb') as f:
+                f.write(orjson.dumps(self.extractions, option=orjson.OPT_INDENT_2))
         except Exception as e:
             logger.error(f"Failed to save extractions: {str(e)}")
             raise ValueError(f"Failed to save extractions: {str(e)}")
     
-    def _save_individual_extraction(self, extraction: Dict[str, Any]) -> None:
+    def close(self) -> None:
+        """Close the extractions log."""
+        if self._log_fh is not None:
+            self._log_fh.close()
+            self._log_fh = None
+    
+    def _save_individual_extraction(self, extraction: Extraction) -> None:
         """
         Save individual extraction to separate file.
         
         Args:
             extraction: Extraction record to save
         """
-        filename = f"{extraction['id']}.json"
+        filename = f"{extraction.id}.json"
         filepath = self.output_dir / filename
         
         try:
-            with open(filepath, 'w') as f:
-                json.dump(extraction, f, indent=2)
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(extraction, option=orjson.OPT_INDENT_2))
         except Exception as e:
             logger.error(f"Failed to save individual extraction: {str(e)}")
     
@@ -152,12 +362,7 @@ class VersionTracker:
         Returns:
             List of extractions ordered by version
         """
-        extractions = [
-            ext for ext in self.extractions["extractions"]
-            if ext["source_file"] == source_file
-        ]
-        
-        return sorted(extractions, key=lambda x: x["version"])
+        return [extraction.to_dict() for extraction in self._by_file.get(source_file, ())]
     
     def get_latest_extraction(self, source_file: str) -> Optional[Dict[str, Any]]:
         """
@@ -169,8 +374,8 @@ class VersionTracker:
         Returns:
             Latest extraction or None if not found
         """
-        extractions = self.get_extraction_history(source_file)
-        return extractions[-1] if extractions else None
+        extractions = self._by_file.get(source_file)
+        return extractions[-1].to_dict() if extractions else None
     
     def get_extraction_by_id(self, extraction_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -182,10 +387,8 @@ class VersionTracker:
         Returns:
             Extraction record or None if not found
         """
-        for extraction in self.extractions["extractions"]:
-            if extraction["id"] == extraction_id:
-                return extraction
-        return None
+        extraction = self._by_id.get(extraction_id)
+        return extraction.to_dict() if extraction else None
     
     def get_all_extractions(self) -> List[Dict[str, Any]]:
         """
@@ -194,7 +397,7 @@ class VersionTracker:
         Returns:
             List of all extractions
         """
-        return self.extractions["extractions"]
+        return [extraction.to_dict() for extraction in self.extractions["extractions"]]
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -212,17 +415,13 @@ class VersionTracker:
                 "latest_extraction": None
             }
         
-        unique_files = len(set(ext["source_file"] for ext in extractions))
-        latest_extraction = max(extractions, key=lambda x: x["extracted_at"])
-        
         return {
             "total_extractions": len(extractions),
-            "unique_files": unique_files,
-            "latest_extraction": latest_extraction["extracted_at"],
-            "files_with_multiple_versions": len([
-                source_file for source_file in set(ext["source_file"] for ext in extractions)
-                if len(self.get_extraction_history(source_file)) > 1
-            ])
+            "unique_files": len(self._by_file),
+            "latest_extraction": max(ext.extracted_at for ext in extractions),
+            "files_with_multiple_versions": sum(
+                len(history) > 1 for history in self._by_file.values()
+            )
         }
     
     def export_audit_trail(self, output_file: str) -> None:
@@ -233,14 +432,14 @@ class VersionTracker:
             output_file: Path to output file
         """
         audit_data = {
-            "exported_at": datetime.utcnow().isoformat(),
+            "exported_at": _utc_now_iso(),
             "statistics": self.get_statistics(),
             "extractions": self.extractions["extractions"]
         }
         
         try:
-            with open(output_file, 'w') as f:
-                json.dump(audit_data, f, indent=2)
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(audit_data, option=orjson.OPT_INDENT_2))
             logger.info(f"Exported audit trail to {output_file}")
         except Exception as e:
             logger.error(f"Failed to export audit trail: {str(e)}")